@@ -13,50 +13,45 @@ MetaHuman 骨架方向求解器 - 主程序
 import sys
 import os
 import numpy as np
-from quaternion_solver import QuaternionSolverXML
+from quaternion_solver import get_default_solver
 
 # 添加当前目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
+# 动画数据统一使用float32：方向/四元数精度足够，内存带宽减半
+_F32 = np.float32
+
+# 前11个骨骼的基本T-pose位置，其余骨骼按固定偏移链式生成
+_BASE_POSITIONS = np.array([
+    [0, 0, 0],          # root
+    [0, 0.1, 0],        # pelvis
+    [0, 0.3, 0],        # spine_01
+    [0, 0.5, 0],        # spine_02
+    [0, 0.7, 0],        # spine_03
+    [0, 0.9, 0],        # neck_01
+    [0, 1.0, 0],        # head
+    [-0.1, 0.7, 0],     # clavicle_l
+    [-0.3, 0.7, 0],     # upperarm_l
+    [-0.5, 0.7, 0],     # lowerarm_l
+    [-0.7, 0.7, 0],     # hand_l
+], dtype=_F32)
+
+
 def create_test_animation_data(num_frames: int = 10) -> np.ndarray:
-    """创建测试动画数据"""
-    np.random.seed(42)
-    
-    animation_data = np.zeros((num_frames, 68, 3))
-    
-    for frame in range(num_frames):
-        # 基本T-pose位置加上轻微动画
-        positions = np.array([
-            [0, 0, 0],          # root
-            [0, 0.1, 0],        # pelvis
-            [0, 0.3, 0],        # spine_01
-            [0, 0.5, 0],        # spine_02
-            [0, 0.7, 0],        # spine_03
-            [0, 0.9, 0],        # neck_01
-            [0, 1.0, 0],        # head
-            [-0.1, 0.7, 0],     # clavicle_l
-            [-0.3, 0.7, 0],     # upperarm_l
-            [-0.5, 0.7, 0],     # lowerarm_l
-            [-0.7, 0.7, 0],     # hand_l
-        ])
-        
-        # 添加简单动画（轻微摆动）
-        time = frame / num_frames * 2 * np.pi
-        sway = 0.05 * np.sin(time)
-        
-        # 填充剩余位置
-        for i in range(68):
-            if i < len(positions):
-                animation_data[frame, i] = positions[i]
-                animation_data[frame, i, 0] += sway
-            else:
-                # 为剩余骨骼生成合理位置
-                if i >= 11:
-                    parent_idx = i - 1 if i > 0 else 0
-                    if parent_idx < 68:
-                        animation_data[frame, i] = animation_data[frame, parent_idx] + np.array([0.05, 0.05, 0])
-    
+    """创建测试动画数据（整体向量化，无逐帧/逐骨骼Python循环）"""
+    # 索引11..67在T-pose中从hand_l按[0.05, 0.05, 0]逐级偏移
+    offsets = np.arange(1, 68 - len(_BASE_POSITIONS) + 1, dtype=_F32)[:, None] \
+        * np.array([0.05, 0.05, 0.0], dtype=_F32)
+    tpose = np.vstack([_BASE_POSITIONS, _BASE_POSITIONS[-1] + offsets])
+
+    # 轻微摆动动画：所有骨骼的x坐标随帧同步偏移
+    time = np.arange(num_frames, dtype=_F32) / num_frames * 2 * np.pi
+    sway = _F32(0.05) * np.sin(time)
+
+    animation_data = np.broadcast_to(tpose, (num_frames, 68, 3)).copy()
+    animation_data[:, :, 0] += sway[:, None]
+
     return animation_data
 
 
@@ -66,7 +61,7 @@ def demo_workflow():
     
     try:
         print("1. Loading skeleton from URDF XML file...")
-        solver = QuaternionSolverXML("metahuman.urdf")
+        solver = get_default_solver()
         
         print("2. Creating sample animation data...")
         animation_data = create_test_animation_data(5)
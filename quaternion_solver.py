@@ -1,6 +1,39 @@
+import functools
+import logging
+
 import numpy as np
 from typing import List, Tuple, Optional
-from urdf_parser import URDFParser, URDFJoint
+from urdf_parser import URDFJoint, load_urdf
+from quat_kernel import HAS_NUMBA, SkeletonArrays, solve_sequence
+
+# cupy为可选依赖，仅在use_gpu=True时需要
+try:
+    import cupy
+except ImportError:
+    cupy = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def _readonly(values) -> np.ndarray:
+    arr = np.array(values)
+    arr.flags.writeable = False
+    return arr
+
+
+# 共享的只读常量，热路径直接返回引用而不是每次分配新数组
+_UNIT_Y = _readonly([0.0, 1.0, 0.0])
+_DEFAULT_Z_UP = _readonly([0.0, 0.0, 1.0])
+_IDENTITY_Q = _readonly([1.0, 0.0, 0.0, 0.0])
+_Q_180_X = _readonly([0.0, 1.0, 0.0, 0.0])  # 绕X轴旋转180度
+_Q_180_Z = _readonly([0.0, 0.0, 0.0, 1.0])  # 绕Z轴旋转180度
+_CONJ_SIGNS = _readonly([1.0, -1.0, -1.0, -1.0])
+
+# NumPy批量路径的帧分块大小：每块的中间数组（十余个float32 (tile,68) slab）
+# 合计约数MB，能留在L2/L3内，长序列下避免ufunc链反复扫过整段内存
+_BATCH_TILE_FRAMES = 4096
+
 
 class QuaternionSolverXML:
     """从URDF XML文件加载骨架并计算局部四元数"""
@@ -12,43 +45,144 @@ class QuaternionSolverXML:
         Args:
             urdf_file_path: URDF XML文件路径
         """
-        self.urdf_parser = URDFParser(urdf_file_path)
+        # 文件未修改时复用缓存的解析结果，避免重复读盘+解析XML
+        self.urdf_parser = load_urdf(urdf_file_path)
         self.links = self.urdf_parser.links
         self.joints = self.urdf_parser.joints
         
-        print(f"Loaded skeleton from {urdf_file_path}")
-        print(f"  Links: {len(self.links)}")
-        print(f"  Joints: {len(self.joints)}")
+        # 诊断信息走惰性logging：未开启debug时零格式化/零stdout开销，
+        # 批量创建求解器（如逐subject）不再被打印刷屏拖慢
+        logger.debug("Loaded skeleton from %s", urdf_file_path)
+        logger.debug("  Links: %d", len(self.links))
+        logger.debug("  Joints: %d", len(self.joints))
         
         # 验证结构
         if not self.urdf_parser.validate_structure():
             raise ValueError("URDF structure validation failed")
+
+        # 一次性预计算所有关节的T-pose方向表，形状为 (num_joints, 3)
+        # 避免在每帧循环中逐个访问joint对象；float32精度对方向向量足够
+        self._tpose_dirs = np.stack([joint.tpose_direction
+                                     for joint in self.joints]).astype(np.float32)
+        # 按child索引查找parent→child的T-pose方向，形状为 (num_links, 3)
+        self._tpose_pc_dirs = np.zeros((len(self.links), 3), dtype=np.float32)
+        for joint in self.joints:
+            self._tpose_pc_dirs[joint.child_index] = joint.tpose_direction
+
+        # JIT内核使用的连续索引/方向数组
+        self._parent_idx = np.ascontiguousarray(self.urdf_parser.parent_indices_np)
+        self._child_idx = np.ascontiguousarray(self.urdf_parser.child_indices_np)
+        self._tpose_dirs64 = np.ascontiguousarray(self._tpose_dirs, dtype=np.float64)
+        # 批量路径使用的起始方向表：第0行为root的默认方向，其余为
+        # 归一化后的T-pose方向（零向量退化为Z轴向上）
+        tpose_norms = np.linalg.norm(self._tpose_dirs64, axis=-1, keepdims=True)
+        tpose_unit = np.where(tpose_norms < 1e-8, _DEFAULT_Z_UP,
+                              self._tpose_dirs64 / np.maximum(tpose_norms, 1e-12))
+        self._vfrom_unit = np.vstack([_UNIT_Y[None], tpose_unit])
+        self._vfrom_unit32 = self._vfrom_unit.astype(np.float32)
+        # 不变式：_tpose_unit各行均为单位向量，逐帧路径据此跳过重复归一化
+        self._tpose_unit = self._vfrom_unit[1:]
+        # 每个骨骼的反平行退化四元数（绕垂直于起始方向的轴旋转180度），
+        # 在初始化时选好垂直轴，批量路径无需逐调用重建
+        self._fallback_q = np.where(
+            (np.abs(self._vfrom_unit[:, 0]) > 0.9)[:, None],
+            _Q_180_Z, _Q_180_X)
+        self._fallback_q32 = self._fallback_q.astype(np.float32)
+        self._skel_arrays = SkeletonArrays(
+            parent_idx=self._parent_idx,
+            child_idx=self._child_idx,
+            topo=np.ascontiguousarray(self.urdf_parser._topo_order),
+            tpose_dirs=self._tpose_dirs64,
+            children_ptr=np.ascontiguousarray(
+                self.urdf_parser._children_ptr.astype(np.int32)),
+            children_idx=np.ascontiguousarray(self.urdf_parser._children_idx),
+        )
+        self._freeze_tables()
     
     @staticmethod
     def normalize_vector(v: np.ndarray) -> np.ndarray:
         """Normalize a vector"""
-        norm = np.linalg.norm(v)
-        if norm < 1e-8:
-            return np.array([0.0, 0.0, 1.0])  # Default to Z-up if zero vector
-        return v / norm
+        # 3元素向量走np.linalg.norm的BLAS调度开销过大，直接点积+sqrt
+        norm_sq = v.dot(v)
+        if norm_sq < 1e-16:
+            return _DEFAULT_Z_UP  # Default to Z-up if zero vector
+        return v * (1.0 / np.sqrt(norm_sq))
     
     @staticmethod
     def quaternion_multiply(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
         """Multiply two quaternions"""
-        w1, x1, y1, z1 = q1
-        w2, x2, y2, z2 = q2
-        
-        w = w1*w2 - x1*x2 - y1*y2 - z1*z2
-        x = w1*x2 + x1*w2 + y1*z2 - z1*y2
-        y = w1*y2 - x1*z2 + y1*w2 + z1*x2
-        z = w1*z2 + x1*y2 - y1*x2 + z1*w2
-        
-        return np.array([w, x, y, z])
+        # 显式按下标取标量，避免对ndarray做迭代解包（逐元素装箱更慢）
+        w1 = q1[0]; x1 = q1[1]; y1 = q1[2]; z1 = q1[3]
+        w2 = q2[0]; x2 = q2[1]; y2 = q2[2]; z2 = q2[3]
+
+        return np.array([
+            w1*w2 - x1*x2 - y1*y2 - z1*z2,
+            w1*x2 + x1*w2 + y1*z2 - z1*y2,
+            w1*y2 - x1*z2 + y1*w2 + z1*x2,
+            w1*z2 + x1*y2 - y1*x2 + z1*w2
+        ])
     
+    @staticmethod
+    def _normalize_batch(q: np.ndarray) -> np.ndarray:
+        """原地批量归一化四元数数组，形状为 (..., 4)
+
+        einsum求平方和+一次rsqrt广播相乘，不物化中间norm向量；
+        用于消除fastmath内核可能引入的微小范数漂移。返回q本身。
+        """
+        inv = 1.0 / np.sqrt(np.einsum('...i,...i->...', q, q))
+        q *= inv[..., None]
+        return q
+
+    @staticmethod
+    def fast_renormalize(q: np.ndarray) -> np.ndarray:
+        """一阶泰勒近似的快速重归一化，形状为 (..., 4)
+
+        q * 0.5*(3 - q·q) 是 q/||q|| 在 ||q||≈1 处的一阶展开，
+        不含sqrt与除法。适合消除乘法链累积的微小漂移
+        （|‖q‖-1| ≲ 1e-3 时误差为二阶小量）；漂移较大时
+        仍应使用_normalize_batch做完整归一化。
+        """
+        return q * (0.5 * (3.0 - np.einsum('...i,...i->...', q, q)))[..., None]
+
+    @staticmethod
+    def quat_mul_batch(Q: np.ndarray, P: np.ndarray) -> np.ndarray:
+        """批量Hamilton乘积 Q*P，支持任意广播形状 (..., 4)
+
+        把每个q展开成4x4左乘矩阵后用einsum一次完成全部乘法，
+        大批量时走向量化的C内核。单个四元数仍用quaternion_multiply
+        （构建矩阵的开销在标量场景下不划算）。
+        """
+        qr = Q[..., 0]; qi = Q[..., 1]; qj = Q[..., 2]; qk = Q[..., 3]
+        M = np.stack([
+            np.stack([qr, -qi, -qj, -qk], axis=-1),
+            np.stack([qi,  qr, -qk,  qj], axis=-1),
+            np.stack([qj,  qk,  qr, -qi], axis=-1),
+            np.stack([qk, -qj,  qi,  qr], axis=-1),
+        ], axis=-2)
+        return np.einsum('...ij,...j->...i', M, P)
+
+    @staticmethod
+    def quaternion_multiply_conj(q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
+        """计算 conj(q1) * q2，符号直接折叠进Hamilton乘积
+
+        供需要父子相对旋转（parent_world^-1 * child_world）的调用方使用，
+        免去先物化共轭四元数再相乘的一次分配和一趟内存读写。
+        """
+        w1 = q1[0]; x1 = q1[1]; y1 = q1[2]; z1 = q1[3]
+        w2 = q2[0]; x2 = q2[1]; y2 = q2[2]; z2 = q2[3]
+
+        return np.array([
+            w1*w2 + x1*x2 + y1*y2 + z1*z2,
+            w1*x2 - x1*w2 - y1*z2 + z1*y2,
+            w1*y2 + x1*z2 - y1*w2 - z1*x2,
+            w1*z2 - x1*y2 + y1*x2 - z1*w2
+        ])
+
     @staticmethod
     def quaternion_conjugate(q: np.ndarray) -> np.ndarray:
         """Get quaternion conjugate"""
-        return np.array([q[0], -q[1], -q[2], -q[3]])
+        # 单次向量化乘法，避免逐元素取负再重新组装list
+        return q * _CONJ_SIGNS
     
     def quaternion_from_vectors_standard(self, vec_from: np.ndarray, vec_to: np.ndarray) -> np.ndarray:
         """
@@ -62,33 +196,153 @@ class QuaternionSolverXML:
         dot_product = np.dot(vec_from, vec_to)
         
         if abs(dot_product + 1.0) < 1e-6:
-            # 180-degree rotation
-            perp = np.array([1.0, 0.0, 0.0])
-            if abs(np.dot(vec_from, perp)) > 0.9:
-                perp = np.array([0.0, 0.0, 1.0])
-            return np.array([0.0, perp[0], perp[1], perp[2]])
+            # 180-degree rotation (shared constant, axis perpendicular to vec_from)
+            if abs(vec_from[0]) > 0.9:
+                return _Q_180_Z
+            return _Q_180_X
         elif abs(dot_product - 1.0) < 1e-6:
             # No rotation needed
-            return np.array([1.0, 0.0, 0.0, 0.0])
+            return _IDENTITY_Q
         else:
-            # Calculate rotation angle and axis
-            theta = np.arccos(np.clip(dot_product, -1.0, 1.0))
-            cross_product = np.cross(vec_from, vec_to)
-            axis = self.normalize_vector(cross_product)
-            
-            # Standard quaternion formula
-            cos_half_theta = np.cos(theta / 2.0)
-            sin_half_theta = np.sin(theta / 2.0)
-            
-            quaternion = np.array([
-                cos_half_theta,
-                axis[0] * sin_half_theta,
-                axis[1] * sin_half_theta,
-                axis[2] * sin_half_theta
+            # 最短弧代数形式：normalize([1+dot, a×b]) 与
+            # [cos(θ/2), sin(θ/2)·axis] 完全等价，省去arccos/cos/sin。
+            # 对单位输入有 ||(1+dot, a×b)||² = 2(1+dot)，
+            # 且 (1+dot)/s = s/2，只需一次sqrt。叉积手工展开
+            s = np.sqrt(2.0 * (1.0 + dot_product))
+            inv_s = 1.0 / s
+            return np.array([
+                0.5 * s,
+                (vec_from[1]*vec_to[2] - vec_from[2]*vec_to[1]) * inv_s,
+                (vec_from[2]*vec_to[0] - vec_from[0]*vec_to[2]) * inv_s,
+                (vec_from[0]*vec_to[1] - vec_from[1]*vec_to[0]) * inv_s
             ])
-            
-            return quaternion
     
+    def quaternion_from_vectors_optimized(self, vec_from: np.ndarray, vec_to: np.ndarray) -> np.ndarray:
+        """半向量法计算从vec_from到vec_to的旋转四元数
+
+        h = normalize(a+b) 后 q = (a·h, a×h) 天然为单位四元数，
+        无需最后的显式归一化；数值上在 a≈-b 附近比 (1+dot, a×b)
+        形式更稳定（该情形仍由180度分支显式处理）。
+        与quaternion_from_vectors_standard结果一致。
+        """
+        vec_from = self.normalize_vector(vec_from)
+        vec_to = self.normalize_vector(vec_to)
+
+        dot_product = np.dot(vec_from, vec_to)
+
+        if abs(dot_product + 1.0) < 1e-6:
+            # 180度旋转：取与vec_from垂直的轴
+            if abs(vec_from[0]) > 0.9:
+                return _Q_180_Z
+            return _Q_180_X
+
+        half = vec_from + vec_to
+        half = half * (1.0 / np.sqrt(half.dot(half)))
+        return np.array([
+            vec_from.dot(half),
+            vec_from[1]*half[2] - vec_from[2]*half[1],
+            vec_from[2]*half[0] - vec_from[0]*half[2],
+            vec_from[0]*half[1] - vec_from[1]*half[0]
+        ])
+
+    def quaternion_from_unit_vectors(self, vec_from: np.ndarray, vec_to: np.ndarray) -> np.ndarray:
+        """同quaternion_from_vectors_standard，但假定两个输入均已为单位向量
+
+        供传入预归一化方向（如_tpose_unit表）的热路径使用，
+        每次调用省去两次sqrt+除法，且 ||(1+dot, a×b)||² = 2(1+dot) 严格成立。
+        """
+        dot_product = np.dot(vec_from, vec_to)
+
+        if abs(dot_product + 1.0) < 1e-6:
+            if abs(vec_from[0]) > 0.9:
+                return _Q_180_Z
+            return _Q_180_X
+        elif abs(dot_product - 1.0) < 1e-6:
+            return _IDENTITY_Q
+        else:
+            s = np.sqrt(2.0 * (1.0 + dot_product))
+            inv_s = 1.0 / s
+            return np.array([
+                0.5 * s,
+                (vec_from[1]*vec_to[2] - vec_from[2]*vec_to[1]) * inv_s,
+                (vec_from[2]*vec_to[0] - vec_from[0]*vec_to[2]) * inv_s,
+                (vec_from[0]*vec_to[1] - vec_from[1]*vec_to[0]) * inv_s
+            ])
+
+    @staticmethod
+    def quaternion_from_vectors_batch(v_from: np.ndarray, v_to: np.ndarray) -> np.ndarray:
+        """quaternion_from_vectors_standard的批量版：(N,3)×(N,3) → (N,4)
+
+        一次Python调用处理整批向量对，归一化/点积/叉积/最短弧
+        全部走向量化内核，退化情形与标量版语义一致
+        （零向量退化为Z轴向上，反平行取垂直轴的180度旋转）。
+        """
+        v_from = np.asarray(v_from, dtype=np.float64)
+        v_to = np.asarray(v_to, dtype=np.float64)
+
+        def _unit(v):
+            norm_sq = np.einsum('ni,ni->n', v, v)
+            zero = (norm_sq < 1e-16)[:, None]
+            inv = 1.0 / np.sqrt(np.maximum(norm_sq, 1e-24))
+            return np.where(zero, _DEFAULT_Z_UP, v * inv[:, None])
+
+        a = _unit(v_from)
+        b = _unit(v_to)
+
+        dot = np.einsum('ni,ni->n', a, b)
+        qw = 1.0 + dot
+        inv = 1.0 / np.sqrt(np.maximum(2.0 * qw, 1e-24))
+
+        out = np.empty((a.shape[0], 4))
+        out[:, 0] = qw * inv
+        out[:, 1] = (a[:, 1]*b[:, 2] - a[:, 2]*b[:, 1]) * inv
+        out[:, 2] = (a[:, 2]*b[:, 0] - a[:, 0]*b[:, 2]) * inv
+        out[:, 3] = (a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]) * inv
+
+        anti = qw < 1e-6
+        if anti.any():
+            out[anti] = np.where((np.abs(a[anti, 0]) > 0.9)[:, None],
+                                 _Q_180_Z, _Q_180_X)
+        return out
+
+    @staticmethod
+    def _fill_quat_from_unit(out_row: np.ndarray, vec_from: np.ndarray,
+                             bx: float, by: float, bz: float) -> None:
+        """quaternion_from_unit_vectors的原地写入版：结果写进out_row
+
+        逐帧热循环用它把四元数直接写入预分配的结果行，避免每个关节
+        分配临时数组再拷贝。目标方向以未归一化的标量分量传入，
+        归一化融合在此处完成（零向量与normalize_vector一致退化为Z轴向上），
+        调用方无需再物化差向量或调用normalize_vector。
+        """
+        norm_sq = bx*bx + by*by + bz*bz
+        if norm_sq < 1e-16:
+            bx, by, bz = 0.0, 0.0, 1.0
+        else:
+            inv_norm = 1.0 / np.sqrt(norm_sq)
+            bx *= inv_norm; by *= inv_norm; bz *= inv_norm
+
+        ax = vec_from[0]; ay = vec_from[1]; az = vec_from[2]
+        dot_product = ax*bx + ay*by + az*bz
+
+        if abs(dot_product + 1.0) < 1e-6:
+            if abs(ax) > 0.9:
+                out_row[0] = 0.0; out_row[1] = 0.0
+                out_row[2] = 0.0; out_row[3] = 1.0
+            else:
+                out_row[0] = 0.0; out_row[1] = 1.0
+                out_row[2] = 0.0; out_row[3] = 0.0
+        elif abs(dot_product - 1.0) < 1e-6:
+            out_row[0] = 1.0; out_row[1] = 0.0
+            out_row[2] = 0.0; out_row[3] = 0.0
+        else:
+            s = np.sqrt(2.0 * (1.0 + dot_product))
+            inv_s = 1.0 / s
+            out_row[0] = 0.5 * s
+            out_row[1] = (ay*bz - az*by) * inv_s
+            out_row[2] = (az*bx - ax*bz) * inv_s
+            out_row[3] = (ax*by - ay*bx) * inv_s
+
     def compute_joint_orientation(self, joint: URDFJoint, parent_pos: np.ndarray, child_pos: np.ndarray) -> np.ndarray:
         """计算关节相对于T-pose的朝向"""
         # 当前方向向量 (从parent到child)
@@ -96,30 +350,47 @@ class QuaternionSolverXML:
         
         # 获取该关节在T-pose中的初始方向
         if joint is None:
-            initial_direction = np.array([0.0, 1.0, 0.0])  # root的默认方向
+            initial_direction = _UNIT_Y  # root的默认方向
         else:
             initial_direction = joint.tpose_direction
         
         # 计算从T-pose到当前朝向的旋转
         return self.quaternion_from_vectors_standard(initial_direction, current_direction)
     
-    def world_to_local_quaternions(self, world_positions: np.ndarray) -> np.ndarray:
+    def world_to_local_quaternions(self, world_positions: np.ndarray,
+                                   out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         将世界坐标转换为关节连接的局部四元数
-        
+
         Args:
             world_positions: 形状为 (68, 3) 的数组，包含所有骨骼的世界坐标
-            
+            out: 可选的 (68, 4) 输出缓冲区（如结果数组的一帧切片），
+                 传入时结果原地写入，逐帧调用方可复用缓冲区避免每帧分配
+
         Returns:
             形状为 (68, 4) 的数组，包含骨骼的局部四元数 (w, x, y, z)，包括root骨骼
         """
         expected_links = len(self.links)
         if world_positions.shape != (expected_links, 3):
             raise ValueError(f"Expected shape ({expected_links}, 3), got {world_positions.shape}")
-        
+
         num_joints = len(self.joints)
-        local_quaternions = np.zeros((num_joints+1, 4))
-        
+        if out is None:
+            out = np.zeros((num_joints+1, 4))
+        elif out.shape != (num_joints + 1, 4):
+            raise ValueError(f"Expected out shape ({num_joints + 1}, 4), got {out.shape}")
+
+        return self._world_to_local_unchecked(world_positions, out)
+
+    def _world_to_local_unchecked(self, world_positions: np.ndarray,
+                                  local_quaternions: np.ndarray) -> np.ndarray:
+        """world_to_local_quaternions的无校验内核：形状由调用方保证
+
+        逐帧调用方（校验一次后循环）直接用它跳过每帧的shape检查，
+        结果原地写入local_quaternions并返回
+        """
+        num_joints = len(self.joints)
+
         # 首先处理root骨骼点
         root_pos = world_positions[0]
         # 如果root_pos的坐标系是(0,0,0), 那么orientation使用(1, 0, 0, 0)
@@ -132,41 +403,160 @@ class QuaternionSolverXML:
             root_orientation = self.compute_joint_orientation(None, origin_pos, root_pos)
         local_quaternions[0] = root_orientation
 
-        # 按顺序处理关节
-        for joint_idx, joint in enumerate(self.joints):
-            parent_pos = world_positions[joint.parent_index]
-            child_pos = world_positions[joint.child_index]
-                
-            # 计算该关节相对于T-pose的世界朝向
-            local_quat = self.compute_joint_orientation(joint, parent_pos, child_pos)
-            local_quaternions[joint_idx+1] = local_quat
+        # 按顺序处理关节：索引与T-pose方向全部来自__init__预计算的数组，
+        # 属性/方法查找提升到循环外的局部变量，循环体内只剩LOAD_FAST
+        parent_idx = self._parent_idx
+        child_idx = self._child_idx
+        tpose_unit = self._tpose_unit
+        fill_quat = self._fill_quat_from_unit
+        for joint_idx in range(num_joints):
+            parent_pos = world_positions[parent_idx[joint_idx]]
+            child_pos = world_positions[child_idx[joint_idx]]
+
+            # 差向量按标量分量传入，归一化融合在fill_quat内部完成，
+            # 循环内不再构造任何临时数组
+            fill_quat(local_quaternions[joint_idx+1],
+                      tpose_unit[joint_idx],
+                      child_pos[0] - parent_pos[0],
+                      child_pos[1] - parent_pos[1],
+                      child_pos[2] - parent_pos[2])
         
         return local_quaternions
     
-    def process_animation_sequence(self, animation_data: np.ndarray) -> np.ndarray:
+    def process_animation_sequence(self, animation_data: np.ndarray,
+                                   use_gpu: bool = False) -> np.ndarray:
         """
         处理整个动画序列
-        
+
         Args:
             animation_data: 形状为 (num_frames, 68, 3) 的数组，包含世界坐标
-            
+            use_gpu: 为True时用cupy在GPU上跑批量路径（适合数千帧以上的长序列）
+
         Returns:
             形状为 (num_frames, 68, 4) 的数组，包含骨骼的局部四元数（包括root）
         """
         num_frames = animation_data.shape[0]
         expected_links = len(self.links)
-        
+
         if animation_data.shape[1:] != (expected_links, 3):
             raise ValueError(f"Expected shape (num_frames, {expected_links}, 3), got {animation_data.shape}")
-        
+
+        # 按输入dtype分派：float64输入保持全精度，其余（动捕数据通常为
+        # float32或整型）走float32路径，精度足够且内存带宽减半。
+        # 输出dtype与计算路径一致
+        dtype = np.float64 if animation_data.dtype == np.float64 else np.float32
+        positions = np.ascontiguousarray(animation_data, dtype=dtype)
+
+        if use_gpu:
+            if cupy is None:
+                raise ImportError("use_gpu=True requires cupy to be installed")
+            # 单次上传，整个流水线在GPU上执行，结果一次拷回
+            gpu_positions = cupy.asarray(positions)
+            gpu_result = cupy.zeros((num_frames, 68, 4), dtype=dtype)
+            self._solve_batch(gpu_positions, gpu_result, xp=cupy)
+            return cupy.asnumpy(gpu_result)
+
         # 返回68个四元数（67个关节 + 1个root骨骼）
-        result = np.zeros((num_frames, 68, 4))
-        
-        for frame_idx in range(num_frames):
-            result[frame_idx] = self.world_to_local_quaternions(animation_data[frame_idx])
-        
+        result = np.zeros((num_frames, 68, 4), dtype=dtype)
+
+        if HAS_NUMBA:
+            # JIT内核整体处理所有帧，消除逐帧Python开销
+            solve_sequence(positions, self._skel_arrays, result)
+        else:
+            # 无numba时走纯NumPy批量路径。超长序列按帧分块求解，
+            # 使(F,68)的中间slab保持在cache内，避免每个ufunc
+            # 都把整段序列在内存间来回搬运
+            if num_frames > _BATCH_TILE_FRAMES:
+                for start in range(0, num_frames, _BATCH_TILE_FRAMES):
+                    stop = start + _BATCH_TILE_FRAMES
+                    self._solve_batch(positions[start:stop], result[start:stop])
+            else:
+                self._solve_batch(positions, result)
+
         return result
+
+    def _solve_batch(self, positions: np.ndarray, out: np.ndarray, xp=np) -> None:
+        """
+        批量求解：把逐帧逐关节的Python循环下推为C层数组运算
+
+        只使用ufunc/einsum/fancy indexing等NumPy与CuPy共有的API，
+        传入xp=cupy即可原样跑在GPU上。
+
+        Args:
+            positions: 形状为 (num_frames, 68, 3) 的世界坐标（xp数组）
+            out: 形状为 (num_frames, 68, 4) 的输出缓冲区，第0列为root骨骼
+            xp: 数组模块，默认numpy，可选cupy
+        """
+        num_frames = positions.shape[0]
+        dtype = positions.dtype
+
+        # 当前方向：第0列为原点→root，其余为parent→child
+        v_to = xp.empty(positions.shape, dtype=dtype)
+        v_to[:, 0] = positions[:, 0]
+        v_to[:, 1:] = positions[:, self._child_idx] - positions[:, self._parent_idx]
+
+        # 归一化：einsum求平方和+倒数sqrt，单次遍历，
+        # 零向量与normalize_vector一致退化为Z轴向上
+        norm_sq = xp.einsum('fji,fji->fj', v_to, v_to)
+        zero = (norm_sq < 1e-16)[..., None]
+        inv_norm = 1.0 / xp.sqrt(xp.maximum(norm_sq, 1e-24))
+        # 默认方向常量按当前dtype转换，避免float64常量把整条
+        # float32流水线悄悄提升回全精度
+        v_unit = xp.where(zero, xp.asarray(_DEFAULT_Z_UP, dtype=dtype),
+                          v_to * inv_norm[..., None])
+
+        # (1+dot, cross) 归一化后即为从T-pose方向到当前方向的最短弧四元数。
+        # 四个分量各自作为连续的(F,68)切片计算（SoA布局），
+        # 只在写入out边界时回到(F,68,4)的AoS布局
+        v_from = xp.asarray(self._vfrom_unit32 if dtype == np.float32
+                            else self._vfrom_unit)
+        dot = xp.einsum('fji,ji->fj', v_unit, v_from)
+
+        # 叉积手工展开：np.cross对这种形状会物化额外的广播临时数组
+        ax = v_from[:, 0]; ay = v_from[:, 1]; az = v_from[:, 2]
+        bx = v_unit[..., 0]; by = v_unit[..., 1]; bz = v_unit[..., 2]
+
+        qw = 1.0 + dot
+        qx = ay*bz - az*by
+        qy = az*bx - ax*bz
+        qz = ax*by - ay*bx
+        # 单位输入下 ||(1+dot, a×b)||² = 2(1+dot)，免去四分量平方和
+        inv = 1.0 / xp.sqrt(xp.maximum(2.0 * qw, 1e-24))
+
+        out[:, :, 0] = qw * inv
+        out[:, :, 1] = qx * inv
+        out[:, :, 2] = qy * inv
+        out[:, :, 3] = qz * inv
+
+        # 反平行退化：用初始化时预选好的180度四元数覆盖，无逐元素分支
+        anti = qw < 1e-6
+        if anti.any():
+            fallback = xp.asarray(self._fallback_q32 if dtype == np.float32
+                                  else self._fallback_q)
+            out[anti] = xp.broadcast_to(fallback, out.shape)[anti]
+
+        # root位于原点的帧输出单位四元数
+        at_origin = (xp.abs(positions[:, 0]) <= 1e-8).all(axis=-1)
+        out[at_origin, 0] = xp.asarray(_IDENTITY_Q)
+
+    def numba_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """返回JIT内核所需的连续数组 (parent_idx, child_idx, tpose_dirs)"""
+        return self._parent_idx, self._child_idx, self._tpose_dirs64
+
+    def as_arrays(self) -> SkeletonArrays:
+        """返回打包成SkeletonArrays的骨架常量表"""
+        return self._skel_arrays
     
+    def _freeze_tables(self):
+        """将预计算表标记为只读，保证实例可以安全共享"""
+        self._tpose_dirs.flags.writeable = False
+        self._tpose_pc_dirs.flags.writeable = False
+        self._tpose_dirs64.flags.writeable = False
+        self._vfrom_unit.flags.writeable = False
+        self._vfrom_unit32.flags.writeable = False
+        self._fallback_q.flags.writeable = False
+        self._fallback_q32.flags.writeable = False
+
     def get_joint_info(self, joint_name: str) -> Optional[URDFJoint]:
         """获取关节信息"""
         return self.urdf_parser.get_joint_by_name(joint_name)
@@ -185,4 +575,10 @@ class QuaternionSolverXML:
     
     def get_link_names(self) -> List[str]:
         """获取所有链接名称"""
-        return [link.name for link in self.links]
\ No newline at end of file
+        return [link.name for link in self.links]
+
+
+@functools.lru_cache(maxsize=1)
+def get_default_solver() -> QuaternionSolverXML:
+    """返回共享的默认求解器实例，避免重复解析URDF和重建预计算表"""
+    return QuaternionSolverXML("metahuman.urdf")
\ No newline at end of file
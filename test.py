@@ -1,3 +1,5 @@
+import sys
+
 import numpy as np
 from quaternion_solver import QuaternionSolverXML
 from urdf_parser import URDFParser
@@ -5,37 +7,42 @@ from urdf_parser import URDFParser
 def test_xml_parsing():
     """测试XML解析"""
     print("=== Testing XML Parsing ===")
-    
+
     try:
         parser = URDFParser("metahuman.urdf")
         parser.print_summary()
-        
+
+        # 逐行输出先攒进列表，最后一次性写出，
+        # 避免许多小print的flush开销盖过被测逻辑本身
+        lines = []
+
         # 测试一些具体的访问方法
-        print(f"\nTesting specific access methods:")
-        
+        lines.append(f"\nTesting specific access methods:")
+
         # 获取root link
         root_link = parser.get_link_by_name("root")
         if root_link:
-            print(f"Root link: {root_link.name} (index {root_link.index})")
-        
+            lines.append(f"Root link: {root_link.name} (index {root_link.index})")
+
         # 获取pelvis joint
         pelvis_joint = parser.get_joint_by_name("root_to_pelvis")
         if pelvis_joint:
-            print(f"Pelvis joint: {pelvis_joint.name}")
-            print(f"  Parent: {pelvis_joint.parent_link} (index {pelvis_joint.parent_index})")
-            print(f"  Child: {pelvis_joint.child_link} (index {pelvis_joint.child_index})")
-            print(f"  T-pose direction: {pelvis_joint.tpose_direction}")
-            print(f"  Joint type: {pelvis_joint.joint_type}")
-            print(f"  Axis: {pelvis_joint.axis}")
-        
+            lines.append(f"Pelvis joint: {pelvis_joint.name}")
+            lines.append(f"  Parent: {pelvis_joint.parent_link} (index {pelvis_joint.parent_index})")
+            lines.append(f"  Child: {pelvis_joint.child_link} (index {pelvis_joint.child_index})")
+            lines.append(f"  T-pose direction: {pelvis_joint.tpose_direction}")
+            lines.append(f"  Joint type: {pelvis_joint.joint_type}")
+            lines.append(f"  Axis: {pelvis_joint.axis}")
+
         # 获取spine_03的所有子关节
         spine03_children = parser.get_children_joints(4)  # spine_03 should be index 4
-        print(f"\nChildren of spine_03 (index 4):")
+        lines.append(f"\nChildren of spine_03 (index 4):")
         for joint in spine03_children:
-            print(f"  {joint.name}: {joint.parent_link} → {joint.child_link}")
-        
+            lines.append(f"  {joint.name}: {joint.parent_link} → {joint.child_link}")
+
+        sys.stdout.write("\n".join(lines) + "\n")
         return True
-        
+
     except Exception as e:
         print(f"✗ XML parsing failed: {e}")
         return False
@@ -53,21 +60,32 @@ def test_xml_quaternion_solver():
         test_positions[:, 1] = np.abs(test_positions[:, 1])  # 确保Y坐标为正
         
         # 单帧测试
+        lines = []
         local_quats = solver.world_to_local_quaternions(test_positions)
-        print(f"✓ XML Single frame test passed: {local_quats.shape}")
-        
-        # 验证四元数归一化
-        norms = np.linalg.norm(local_quats, axis=1)
-        print(f"  Quaternion norms (should be ~1.0): min={norms.min():.3f}, max={norms.max():.3f}")
-        print(f"  Total joints: {len(local_quats)}")
-        
+        lines.append(f"✓ XML Single frame test passed: {local_quats.shape}")
+
+        # 验证四元数归一化（einsum平方和+sqrt，免去np.linalg.norm的
+        # 通用范数分派开销，对长度4的行更合适）
+        norms = np.sqrt(np.einsum('ij,ij->i', local_quats, local_quats))
+        lines.append(f"  Quaternion norms (should be ~1.0): min={norms.min():.3f}, max={norms.max():.3f}")
+        lines.append(f"  Total joints: {len(local_quats)}")
+
+        # fast_renormalize边界：对~1e-3量级的范数漂移，
+        # 一阶修正后的|‖q‖-1|应为二阶小量
+        drifted = local_quats * (1.0 + 1e-3)
+        renormed = solver.fast_renormalize(drifted)
+        drift_err = np.abs(np.sqrt(np.einsum('ij,ij->i', renormed, renormed)) - 1.0).max()
+        assert drift_err < 1e-5, f"fast_renormalize drift too large: {drift_err}"
+        lines.append(f"✓ fast_renormalize drift bound: max |norm-1| = {drift_err:.2e}")
+
         # 动画序列测试
         np.random.seed(42)
         animation_data = np.random.rand(3, 68, 3)
         animation_data[:, :, 1] = np.abs(animation_data[:, :, 1])  # 确保 Y 坐标为正
         result = solver.process_animation_sequence(animation_data)
-        print(f"✓ XML Animation sequence test passed: {result.shape}")
-        
+        lines.append(f"✓ XML Animation sequence test passed: {result.shape}")
+
+        sys.stdout.write("\n".join(lines) + "\n")
         return True
         
     except Exception as e:
@@ -83,28 +101,30 @@ def test_joint_queries():
         solver = QuaternionSolverXML("metahuman.urdf")
         
         # 测试关节信息查询
+        lines = []
         joint_info = solver.get_joint_info("clavicle_l_to_upperarm_l")
         if joint_info:
-            print(f"Joint info for 'clavicle_l_to_upperarm_l':")
-            print(f"  Type: {joint_info.joint_type}")
-            print(f"  Parent: {joint_info.parent_link}")
-            print(f"  Child: {joint_info.child_link}")
-            print(f"  T-pose direction: {joint_info.tpose_direction}")
-            print(f"  Axis: {joint_info.axis}")
-        
+            lines.append(f"Joint info for 'clavicle_l_to_upperarm_l':")
+            lines.append(f"  Type: {joint_info.joint_type}")
+            lines.append(f"  Parent: {joint_info.parent_link}")
+            lines.append(f"  Child: {joint_info.child_link}")
+            lines.append(f"  T-pose direction: {joint_info.tpose_direction}")
+            lines.append(f"  Axis: {joint_info.axis}")
+
         # 测试链接信息查询
         link_info = solver.get_link_info("upperarm_l")
         if link_info:
-            print(f"\nLink info for 'upperarm_l':")
-            print(f"  Name: {link_info.name}")
-            print(f"  Index: {link_info.index}")
-        
+            lines.append(f"\nLink info for 'upperarm_l':")
+            lines.append(f"  Name: {link_info.name}")
+            lines.append(f"  Index: {link_info.index}")
+
         # 获取所有关节名称
         joint_names = solver.get_joint_names()
-        print(f"\nFirst 10 joint names:")
+        lines.append(f"\nFirst 10 joint names:")
         for i, name in enumerate(joint_names[:10]):
-            print(f"  {i:2d}: {name}")
-        
+            lines.append(f"  {i:2d}: {name}")
+
+        sys.stdout.write("\n".join(lines) + "\n")
         return True
         
     except Exception as e:
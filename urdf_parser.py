@@ -1,15 +1,42 @@
+import functools
+import mmap
+import os
 import xml.etree.ElementTree as ET
 import numpy as np
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 
-@dataclass
+# 共享的只读默认方向常量，避免每个joint各分配一份默认向量。
+# 统一float32：方向/轴向量精度足够，且与下游SIMD批量运算的dtype一致
+_UNIT_Y = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+_UNIT_Y.flags.writeable = False
+_UNIT_Z = np.array([0.0, 0.0, 1.0], dtype=np.float32)
+_UNIT_Z.flags.writeable = False
+_ZERO3 = np.array([0.0, 0.0, 0.0], dtype=np.float32)
+_ZERO3.flags.writeable = False
+
+
+def _parse_xyz(elem: Optional[ET.Element], default: np.ndarray) -> np.ndarray:
+    """解析元素的xyz属性为float32三维向量（C连续）
+
+    np.array直接吃split后的字符串列表，数值转换在C层完成，
+    不生成逐元素的临时Python float。元素缺失或无xyz属性时
+    返回共享的只读默认向量。
+    """
+    if elem is None:
+        return default
+    xyz_str = elem.get('xyz')
+    if not xyz_str:
+        return default
+    return np.array(xyz_str.split(), dtype=np.float32)
+
+@dataclass(slots=True)
 class URDFLink:
     """URDF Link (骨骼/链节)"""
     name: str
     index: int
 
-@dataclass 
+@dataclass(slots=True)
 class URDFJoint:
     """URDF Joint (关节/连接)"""
     name: str
@@ -31,149 +58,241 @@ class URDFParser:
         self.joints: List[URDFJoint] = []
         self.link_name_to_index: Dict[str, int] = {}
         self.joint_name_to_index: Dict[str, int] = {}
-        
+        self._validated: Optional[bool] = None
+        self._parse_errors: List[str] = []
+
         self.parse_urdf()
     
     def parse_urdf(self):
-        """解析URDF XML文件"""
+        """解析URDF XML文件（iterparse流式解析，逐元素消费后立即释放）"""
         try:
-            tree = ET.parse(self.urdf_file_path)
-            root = tree.getroot()
-            
-            if root.tag != 'robot':
-                raise ValueError("URDF file must have 'robot' as root element")
-            
-            # 解析所有links
-            self._parse_links(root)
-            
-            # 解析所有joints
-            self._parse_joints(root)
-            
+            root_checked = False
+            # mmap文件后直接交给iterparse（mmap对象本身是file-like），
+            # 解析输入走页缓存零拷贝，重复加载时不再经过缓冲IO栈。
+            # 流式遍历：每个顶层link/joint子树解析完即clear()，
+            # 内存占用与文件大小解耦，不再构建完整DOM
+            with open(self.urdf_file_path, 'rb') as f:
+                # 空文件无法mmap；走XML解析错误路径，报错与ET.parse一致
+                if os.fstat(f.fileno()).st_size == 0:
+                    raise ET.ParseError("no element found: line 1, column 0")
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for event, elem in ET.iterparse(mm, events=('start', 'end')):
+                        if event == 'start':
+                            if not root_checked:
+                                if elem.tag != 'robot':
+                                    raise ValueError("URDF file must have 'robot' as root element")
+                                root_checked = True
+                            continue
+                        if elem.tag == 'link':
+                            self._parse_link(elem)
+                            elem.clear()
+                        elif elem.tag == 'joint':
+                            self._parse_joint(elem)
+                            elem.clear()
+
+            # 解析过程只收集问题不中断，这里一次性报告全部缺陷，
+            # 修复大文件时无需反复"改一处→重新解析"
+            if self._parse_errors:
+                raise ValueError("URDF parse errors: " + "; ".join(self._parse_errors))
+
             # 创建索引映射
             self._create_indices()
-            
+
         except ET.ParseError as e:
             raise ValueError(f"Failed to parse URDF XML: {e}")
         except FileNotFoundError:
             raise FileNotFoundError(f"URDF file not found: {self.urdf_file_path}")
-    
-    def _parse_links(self, root: ET.Element):
-        """解析所有link元素"""
-        links = root.findall('link')
-        
-        for i, link_elem in enumerate(links):
-            name = link_elem.get('name')
-            if not name:
-                raise ValueError(f"Link at index {i} missing 'name' attribute")
-            
-            urdf_link = URDFLink(name=name, index=i)
-            self.links.append(urdf_link)
-    
-    def _parse_joints(self, root: ET.Element):
-        """解析所有joint元素"""
-        joints = root.findall('joint')
-        
-        for joint_elem in joints:
-            name = joint_elem.get('name')
-            joint_type = joint_elem.get('type')
-            
-            if not name or not joint_type:
-                raise ValueError(f"Joint missing 'name' or 'type' attribute")
-            
-            # 解析parent和child
-            parent_elem = joint_elem.find('parent')
-            child_elem = joint_elem.find('child')
-            
-            if parent_elem is None or child_elem is None:
-                raise ValueError(f"Joint '{name}' missing parent or child")
-            
-            parent_link = parent_elem.get('link')
-            child_link = child_elem.get('link')
-            
-            if not parent_link or not child_link:
-                raise ValueError(f"Joint '{name}' missing parent or child link name")
-            
-            # 解析axis (旋转轴)
-            axis_elem = joint_elem.find('axis')
-            axis = np.array([0.0, 0.0, 1.0])  # 默认Z轴
-            if axis_elem is not None:
-                axis_str = axis_elem.get('xyz', '0 0 1')
-                axis = np.array([float(x) for x in axis_str.split()])
-            
-            # 解析origin (位置偏移)
-            origin_elem = joint_elem.find('origin')
-            origin = None
-            if origin_elem is not None:
-                origin_str = origin_elem.get('xyz', '0 0 0')
-                origin = np.array([float(x) for x in origin_str.split()])
-            
-            # 解析自定义的tpose_direction
-            tpose_elem = joint_elem.find('tpose_direction')
-            tpose_direction = np.array([0.0, 1.0, 0.0])  # 默认向上
-            if tpose_elem is not None:
-                tpose_str = tpose_elem.get('xyz', '0 1 0')
-                tpose_direction = np.array([float(x) for x in tpose_str.split()])
-            
-            urdf_joint = URDFJoint(
-                name=name,
-                joint_type=joint_type,
-                parent_link=parent_link,
-                child_link=child_link,
-                parent_index=-1,  # 将在_create_indices中设置
-                child_index=-1,   # 将在_create_indices中设置
-                axis=axis,
-                tpose_direction=tpose_direction,
-                origin=origin
-            )
-            
-            self.joints.append(urdf_joint)
+
+    def _parse_link(self, link_elem: ET.Element):
+        """解析单个link元素"""
+        name = link_elem.get('name')
+        if not name:
+            self._parse_errors.append(
+                f"Link at index {len(self.links)} missing 'name' attribute")
+            return
+
+        urdf_link = URDFLink(name=name, index=len(self.links))
+        self.links.append(urdf_link)
+
+    def _parse_joint(self, joint_elem: ET.Element):
+        """解析单个joint元素"""
+        name = joint_elem.get('name')
+        joint_type = joint_elem.get('type')
+
+        if not name or not joint_type:
+            self._parse_errors.append(
+                f"Joint at index {len(self.joints)} missing 'name' or 'type' attribute")
+            return
+
+        # 一趟扫描收集全部子元素，替代5次find()各自线性遍历
+        subs = {child.tag: child for child in joint_elem}
+
+        # 解析parent和child
+        parent_elem = subs.get('parent')
+        child_elem = subs.get('child')
+
+        if parent_elem is None or child_elem is None:
+            self._parse_errors.append(f"Joint '{name}' missing parent or child")
+            return
+
+        parent_link = parent_elem.get('link')
+        child_link = child_elem.get('link')
+
+        if not parent_link or not child_link:
+            self._parse_errors.append(f"Joint '{name}' missing parent or child link name")
+            return
+
+        # 解析axis (旋转轴)，默认Z轴（共享只读常量）
+        axis = _parse_xyz(subs.get('axis'), _UNIT_Z)
+
+        # 解析origin (位置偏移)，无origin元素时保持None
+        origin_elem = subs.get('origin')
+        origin = None
+        if origin_elem is not None:
+            origin = _parse_xyz(origin_elem, _ZERO3)
+
+        # 解析自定义的tpose_direction，默认向上（共享只读常量）
+        tpose_direction = _parse_xyz(subs.get('tpose_direction'), _UNIT_Y)
+
+        urdf_joint = URDFJoint(
+            name=name,
+            joint_type=joint_type,
+            parent_link=parent_link,
+            child_link=child_link,
+            parent_index=-1,  # 将在_create_indices中设置
+            child_index=-1,   # 将在_create_indices中设置
+            axis=axis,
+            tpose_direction=tpose_direction,
+            origin=origin
+        )
+
+        self.joints.append(urdf_joint)
     
     def _create_indices(self):
         """创建名称到索引的映射"""
         # 创建link名称到索引的映射
         self.link_name_to_index = {link.name: link.index for link in self.links}
         
+        # 批量校验link引用：先做一次集合差快速判断，
+        # 只有确实存在未知引用时才回扫生成逐joint的详细信息
+        known = set(self.link_name_to_index)
+        referenced = ({joint.parent_link for joint in self.joints}
+                      | {joint.child_link for joint in self.joints})
+        if referenced - known:
+            problems = [
+                f"{role} link '{link}' not found for joint '{joint.name}'"
+                for joint in self.joints
+                for role, link in (("Parent", joint.parent_link),
+                                   ("Child", joint.child_link))
+                if link not in known
+            ]
+            raise ValueError("; ".join(problems))
+
         # 为joints设置parent和child的索引
         for joint in self.joints:
-            if joint.parent_link not in self.link_name_to_index:
-                raise ValueError(f"Parent link '{joint.parent_link}' not found for joint '{joint.name}'")
-            if joint.child_link not in self.link_name_to_index:
-                raise ValueError(f"Child link '{joint.child_link}' not found for joint '{joint.name}'")
-            
             joint.parent_index = self.link_name_to_index[joint.parent_link]
             joint.child_index = self.link_name_to_index[joint.child_link]
         
         # 创建joint名称到索引的映射
         self.joint_name_to_index = {joint.name: i for i, joint in enumerate(self.joints)}
+
+        # child link索引→joint的映射（每个link至多有一个父joint）
+        self._joint_by_child_index = {joint.child_index: joint for joint in self.joints}
+
+        # 预构建CSR风格的 parent→children 索引表
+        # _children_idx按parent索引排序存放joint下标，
+        # _children_ptr[i]:_children_ptr[i+1] 即为link i的所有子joint
+        parents = np.array([joint.parent_index for joint in self.joints], dtype=np.int32)
+        order = np.argsort(parents, kind='stable')
+        sorted_parents = parents[order]
+        self._children_ptr = np.searchsorted(sorted_parents, np.arange(len(self.links) + 1))
+        self._children_idx = order.astype(np.int32)
+
+        # 预计算每个link的父link索引（root为-1）、层级深度、
+        # 以及保证parent先于child的拓扑遍历顺序，供前向运动学按层批量计算
+        self.link_parent_indices = np.full(len(self.links), -1, dtype=np.int32)
+        for joint in self.joints:
+            self.link_parent_indices[joint.child_index] = joint.parent_index
+
+        depth = np.zeros(len(self.links), dtype=np.int32)
+        # link索引通常已满足parent在前，做定点迭代以兼容任意顺序
+        for _ in range(len(self.links)):
+            new_depth = np.where(self.link_parent_indices >= 0,
+                                 depth[self.link_parent_indices] + 1, 0)
+            if np.array_equal(new_depth, depth):
+                break
+            depth = new_depth
+        self._link_depth = depth
+        self._topo_order = np.argsort(depth, kind='stable').astype(np.int32)
+        self._levels = [np.flatnonzero(depth == d).astype(np.int32)
+                        for d in range(int(depth.max()) + 1)]
+
+        # SoA形式的joint索引数组与不可变link名称元组，
+        # 支持fancy indexing（如 positions[child_indices_np]）和下游JIT
+        self.parent_indices_np = parents
+        self.child_indices_np = np.array([joint.child_index for joint in self.joints],
+                                         dtype=np.int32)
+        self.link_names_tuple = tuple(link.name for link in self.links)
+
+        # SoA镜像：全部joint的axis与T-pose方向打包成C连续矩阵，
+        # 下游批量运算（归一化/旋转全部方向）无需逐joint收集小数组。
+        # 预分配后按行填充，零joint的URDF自然得到(0, 3)空表。
+        # parent/child索引沿用上面的int32数组
+        self.axes = np.zeros((len(self.joints), 3), dtype=np.float32)
+        self.tpose_directions = np.zeros((len(self.joints), 3), dtype=np.float32)
+        for i, joint in enumerate(self.joints):
+            self.axes[i] = joint.axis
+            self.tpose_directions[i] = joint.tpose_direction
+        self.parent_indices = self.parent_indices_np
+        self.child_indices = self.child_indices_np
+
+        # 单位化的旋转轴表：轴归一化属于逐帧不变量，只在此处做一次，
+        # 供axis_angle_batch等下游直接使用（零轴退化为Z轴，与默认一致）
+        axis_norm_sq = np.einsum('ij,ij->i', self.axes, self.axes)
+        zero_axis = (axis_norm_sq < 1e-16)[:, None]
+        inv_axis_norm = 1.0 / np.sqrt(np.maximum(axis_norm_sq, 1e-24))
+        self.axes_unit = np.where(zero_axis, _UNIT_Z,
+                                  self.axes * inv_axis_norm[:, None])
     
+    def axis_angle_batch(self, angles: np.ndarray) -> np.ndarray:
+        """把每个joint绕自身旋转轴转angles[j]弧度批量转为四元数
+
+        sin/cos各只调用一次处理全部关节，轴使用预归一化的axes_unit表。
+
+        Args:
+            angles: 形状为 (num_joints,) 的旋转角（弧度）
+
+        Returns:
+            形状为 (num_joints, 4) 的float32四元数 (w, x, y, z)，
+            与本模块其余数组的dtype约定一致
+        """
+        half = 0.5 * np.asarray(angles)
+        out = np.empty((len(self.joints), 4), dtype=np.float32)
+        out[:, 0] = np.cos(half)
+        out[:, 1:] = self.axes_unit * np.sin(half)[:, None]
+        return out
+
     def get_link_by_name(self, name: str) -> Optional[URDFLink]:
-        """通过名称获取link"""
-        for link in self.links:
-            if link.name == name:
-                return link
-        return None
-    
+        """通过名称获取link（O(1)字典查找）"""
+        index = self.link_name_to_index.get(name)
+        return self.links[index] if index is not None else None
+
     def get_joint_by_name(self, name: str) -> Optional[URDFJoint]:
-        """通过名称获取joint"""
-        for joint in self.joints:
-            if joint.name == name:
-                return joint
-        return None
+        """通过名称获取joint（O(1)字典查找）"""
+        index = self.joint_name_to_index.get(name)
+        return self.joints[index] if index is not None else None
     
     def get_joint_by_child_index(self, child_index: int) -> Optional[URDFJoint]:
-        """通过子link索引获取joint"""
-        for joint in self.joints:
-            if joint.child_index == child_index:
-                return joint
-        return None
+        """通过子link索引获取joint（O(1)字典查找）"""
+        return self._joint_by_child_index.get(child_index)
     
     def get_children_joints(self, parent_index: int) -> List[URDFJoint]:
-        """获取指定parent的所有子joints"""
-        children = []
-        for joint in self.joints:
-            if joint.parent_index == parent_index:
-                children.append(joint)
-        return children
+        """获取指定parent的所有子joints（CSR表切片，无需线性扫描）"""
+        if parent_index < 0 or parent_index >= len(self.links):
+            return []
+        start = self._children_ptr[parent_index]
+        end = self._children_ptr[parent_index + 1]
+        return [self.joints[j] for j in self._children_idx[start:end]]
     
     def print_summary(self):
         """打印URDF结构摘要"""
@@ -198,19 +317,19 @@ class URDFParser:
             print(f"  ... and {len(self.joints) - 10} more joints")
     
     def validate_structure(self) -> bool:
-        """验证URDF结构的完整性"""
+        """验证URDF结构的完整性（结果按实例缓存，重复调用不再扫描）"""
+        if self._validated is None:
+            self._validated = self._validate_structure()
+        return self._validated
+
+    def _validate_structure(self) -> bool:
         try:
             # 检查是否有root link (没有parent的link)
-            root_links = []
-            for link in self.links:
-                has_parent = False
-                for joint in self.joints:
-                    if joint.child_index == link.index:
-                        has_parent = True
-                        break
-                if not has_parent:
-                    root_links.append(link)
-            
+            # 单趟标记has_parent位图，替代links×joints的嵌套扫描
+            has_parent = np.zeros(len(self.links), dtype=bool)
+            has_parent[[joint.child_index for joint in self.joints]] = True
+            root_links = [self.links[i] for i in np.flatnonzero(~has_parent)]
+
             if len(root_links) != 1:
                 print(f"Warning: Expected 1 root link, found {len(root_links)}")
                 for root in root_links:
@@ -230,4 +349,18 @@ class URDFParser:
             
         except Exception as e:
             print(f"✗ URDF structure validation failed: {e}")
-            return False
\ No newline at end of file
+            return False
+
+@functools.lru_cache(maxsize=8)
+def _load_urdf_cached(path: str, mtime_ns: int) -> URDFParser:
+    """按(路径, 修改时间)缓存解析结果；mtime_ns仅用作缓存键"""
+    return URDFParser(path)
+
+
+def load_urdf(path: str) -> URDFParser:
+    """解析URDF文件，文件未被修改时直接复用缓存的解析结果"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"URDF file not found: {path}")
+    return _load_urdf_cached(path, mtime_ns)